@@ -1,17 +1,23 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Header, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 import os
 import logging
 import base64
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import json
+import hashlib
+import gzip
+import asyncio
+import random
+import time
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
@@ -31,6 +37,50 @@ api_router = APIRouter(prefix="/api")
 # Initialize LLM Chat
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY')
 
+def parse_model_chain(value: str):
+    """Parse "provider:model,provider:model" into a list of (provider, model) pairs"""
+    return [tuple(item.strip().split(":", 1)) for item in value.split(",") if item.strip()]
+
+# LLM routing: per-purpose attempt timeout, total time budget and fallback chain (seconds)
+LLM_ROUTES = {
+    "chat": {
+        "timeout": float(os.environ.get('LLM_CHAT_TIMEOUT', '20')),
+        "budget": float(os.environ.get('LLM_CHAT_BUDGET', '45')),
+        "models": parse_model_chain(os.environ.get('LLM_CHAT_MODELS', 'openai:gpt-4o-mini,gemini:gemini-2.0-flash'))
+    },
+    "translation": {
+        "timeout": float(os.environ.get('LLM_TRANSLATION_TIMEOUT', '10')),
+        "budget": float(os.environ.get('LLM_TRANSLATION_BUDGET', '20')),
+        "models": parse_model_chain(os.environ.get('LLM_TRANSLATION_MODELS', 'openai:gpt-4o-mini,gemini:gemini-2.0-flash'))
+    },
+    # Batch runs off-peak, so it can afford to wait longer per advisory
+    "advisory": {
+        "timeout": float(os.environ.get('LLM_ADVISORY_TIMEOUT', '60')),
+        "budget": float(os.environ.get('LLM_ADVISORY_BUDGET', '180')),
+        "models": parse_model_chain(os.environ.get('LLM_ADVISORY_MODELS', 'openai:gpt-4o-mini,gemini:gemini-2.0-flash'))
+    }
+}
+LLM_MAX_ATTEMPTS = int(os.environ.get('LLM_MAX_ATTEMPTS', '2'))
+LLM_BACKOFF_SECONDS = float(os.environ.get('LLM_BACKOFF_SECONDS', '0.5'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', '30'))
+
+# Retention policy (days); set HISTORY_RETENTION_DAYS=0 to disable archiving
+IMAGE_RETENTION_DAYS = int(os.environ.get('IMAGE_RETENTION_DAYS', '30'))
+if IMAGE_RETENTION_DAYS <= 0:
+    raise ValueError("IMAGE_RETENTION_DAYS must be at least 1")
+HISTORY_RETENTION_DAYS = int(os.environ.get('HISTORY_RETENTION_DAYS', '90'))
+ARCHIVE_INTERVAL_SECONDS = int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '3600'))
+ARCHIVE_BATCH_SIZE = 500
+CHAT_PAGE_SIZE = 50
+ESCALATION_PAGE_SIZE = 20
+
+# Daily advisory batch (UTC hour, 0 = 5:30 IST); set ADVISORY_HOUR_UTC=-1 to disable
+ADVISORY_HOUR_UTC = int(os.environ.get('ADVISORY_HOUR_UTC', '0'))
+if not -1 <= ADVISORY_HOUR_UTC <= 23:
+    raise ValueError("ADVISORY_HOUR_UTC must be between 0 and 23, or -1 to disable")
+ADVISORY_CONCURRENCY = int(os.environ.get('ADVISORY_CONCURRENCY', '4'))
+
 # Pydantic Models
 class FarmerProfile(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -40,6 +90,7 @@ class FarmerProfile(BaseModel):
     crops: List[str] = []
     farm_size: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 class FarmerProfileCreate(BaseModel):
     name: str
@@ -54,7 +105,8 @@ class ChatMessage(BaseModel):
     message: str
     response: str
     message_type: str = "text"  # text, image, voice
-    image_data: Optional[str] = None  # base64 encoded image
+    image_data: Optional[str] = None  # base64 encoded image (legacy, new images live in `images`)
+    image_id: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     session_id: str
 
@@ -76,7 +128,8 @@ class WeatherData(BaseModel):
 class DiseaseDetection(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     farmer_id: str
-    image_data: str  # base64
+    image_data: Optional[str] = None  # base64 (legacy, new images live in `images`)
+    image_id: Optional[str] = None
     detected_disease: str
     confidence: float
     treatment_advice: str
@@ -89,6 +142,16 @@ class OfficerEscalation(BaseModel):
     priority: str = "medium"  # low, medium, high
     status: str = "pending"  # pending, assigned, resolved
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class CropAdvisory(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    location: str
+    crop: str
+    date: str  # YYYY-MM-DD (UTC)
+    advisory: str
+    weather: WeatherData
+    created_at: datetime = Field(default_factory=datetime.utcnow)
 
 # Translation Models
 class TranslationRequest(BaseModel):
@@ -102,6 +165,105 @@ class TranslationResponse(BaseModel):
     source_language: str
     target_language: str
 
+# LLM call routing
+class LlmUnavailableError(Exception):
+    """Raised when every model in a purpose's fallback chain failed or was skipped"""
+
+class CircuitBreaker:
+    """Stops calling a model after sustained failures, probing again after a cool-down"""
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+    
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.reset_seconds:
+            return False
+        # Half-open: one caller probes, everyone else waits for its result. A probe
+        # that never reports back (e.g. cancelled) is superseded after another cool-down.
+        if self.probe_started_at is not None and now - self.probe_started_at < self.reset_seconds:
+            return False
+        self.probe_started_at = now
+        return True
+    
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+    
+    def release_probe(self):
+        """Let another caller probe when this one ended without a verdict"""
+        self.probe_started_at = None
+    
+    def record_failure(self):
+        self.failures += 1
+        self.probe_started_at = None
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+circuit_breakers = {}
+
+def get_circuit_breaker(provider: str, model: str) -> CircuitBreaker:
+    key = f"{provider}:{model}"
+    if key not in circuit_breakers:
+        circuit_breakers[key] = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+    return circuit_breakers[key]
+
+def create_llm_chat(provider: str, model: str, session_id: str, system_message: str):
+    return LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=session_id,
+        system_message=system_message
+    ).with_model(provider, model)
+
+async def call_llm(purpose: str, session_id: str, system_message: str, user_message: UserMessage) -> str:
+    """Send a message through the purpose's fallback chain with timeouts, retries and breakers"""
+    route = LLM_ROUTES[purpose]
+    deadline = time.monotonic() + route["budget"]
+    errors = []
+    
+    for provider, model in route["models"]:
+        breaker = get_circuit_breaker(provider, model)
+        for attempt in range(LLM_MAX_ATTEMPTS):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LlmUnavailableError(f"{purpose} budget exhausted: {'; '.join(errors)}")
+            if not breaker.allow():
+                errors.append(f"{provider}:{model} circuit open")
+                break
+            
+            attempt_timeout = min(route["timeout"], remaining)
+            try:
+                chat = create_llm_chat(provider, model, session_id, system_message)
+                response = await asyncio.wait_for(chat.send_message(user_message), timeout=attempt_timeout)
+                breaker.record_success()
+                return response
+            except asyncio.TimeoutError:
+                # A timeout cut short by the budget says nothing about the model's health
+                if attempt_timeout < route["timeout"]:
+                    breaker.release_probe()
+                else:
+                    breaker.record_failure()
+                errors.append(f"{provider}:{model} attempt {attempt + 1}: timed out after {attempt_timeout:.2f}s")
+                logging.warning(f"LLM {purpose} call to {provider}:{model} timed out after {attempt_timeout:.2f}s")
+                # Retrying a hanging model would spend the rest of the budget; try the next one
+                break
+            except Exception as e:
+                breaker.record_failure()
+                errors.append(f"{provider}:{model} attempt {attempt + 1}: {type(e).__name__} {str(e)}")
+                logging.warning(f"LLM {purpose} call to {provider}:{model} failed: {type(e).__name__} {str(e)}")
+            
+            if attempt + 1 < LLM_MAX_ATTEMPTS:
+                # Full jitter keeps retries from many requests from arriving together
+                await asyncio.sleep(random.uniform(0, LLM_BACKOFF_SECONDS * 2 ** attempt))
+    
+    raise LlmUnavailableError(f"No model available for {purpose}: {'; '.join(errors)}")
+
 # Helper functions
 def get_farming_system_message(farmer_profile=None):
     base_message = """You are an AI farming assistant for Malayalam-speaking farmers in Kerala, India. 
@@ -130,13 +292,6 @@ async def get_ai_response(message: str, farmer_id: str, session_id: str, image_d
         farmer_profile = await db.farmers.find_one({"id": farmer_id})
         system_message = get_farming_system_message(farmer_profile)
         
-        # Initialize chat
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=session_id,
-            system_message=system_message
-        ).with_model("openai", "gpt-4o-mini")
-        
         # Create user message
         user_message = UserMessage(text=message)
         
@@ -154,7 +309,7 @@ async def get_ai_response(message: str, farmer_id: str, session_id: str, image_d
             user_message = UserMessage(text=enhanced_message)
         
         # Get AI response
-        response = await chat.send_message(user_message)
+        response = await call_llm("chat", session_id, system_message, user_message)
         return response
         
     except Exception as e:
@@ -172,23 +327,335 @@ async def translate_text(text: str, source_lang: str, target_lang: str):
         
         Translation:"""
         
-        # Initialize chat for translation
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"translation_{uuid.uuid4()}",
-            system_message="You are a professional translator. Provide accurate translations without any additional text."
-        ).with_model("openai", "gpt-4o-mini")
-        
         # Get translation
         user_message = UserMessage(text=translation_prompt)
-        response = await chat.send_message(user_message)
+        response = await call_llm(
+            "translation",
+            f"translation_{uuid.uuid4()}",
+            "You are a professional translator. Provide accurate translations without any additional text.",
+            user_message
+        )
         
         return response.strip()
         
+    except LlmUnavailableError:
+        # Let the endpoint answer 503 rather than showing the model chain to users
+        raise
     except Exception as e:
         logging.error(f"Translation error: {str(e)}")
         return f"Translation failed: {str(e)}"
 
+def make_etag(*parts) -> str:
+    """Build a strong ETag from version fields (ids, counts, timestamps)"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison is fine for If-None-Match, so ignore any W/ prefix
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+def after_cursor(field: str, since: datetime, after_id: Optional[str]) -> dict:
+    """Keyset condition for records after (since, after_id) in (field, id) order
+
+    Timestamps are stored with millisecond precision, so records can share one;
+    the id tiebreaker keeps them from being skipped across a page boundary.
+    """
+    if not after_id:
+        return {field: {"$gt": since}}
+    return {"$or": [{field: {"$gt": since}}, {field: since, "id": {"$gt": after_id}}]}
+
+def farmer_etag(farmer: dict) -> str:
+    return make_etag(farmer["id"], farmer.get("updated_at") or farmer.get("created_at"))
+
+async def get_collection_version(collection, query: dict, field: str = "created_at"):
+    """Return (count, latest timestamp) for a query without loading the documents.
+
+    Only the query fields and `field` are touched, so this is served from the
+    indexes created on startup.
+    """
+    pipeline = [
+        {"$match": query},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "latest": {"$max": f"${field}"}}}
+    ]
+    result = await collection.aggregate(pipeline).to_list(1)
+    if not result:
+        return 0, None
+    return result[0]["count"], result[0]["latest"]
+
+# Retention and archival helpers
+async def ensure_image_ttl_index():
+    """Create the `images` TTL index, or update it when IMAGE_RETENTION_DAYS changed
+
+    Raw images expire on their own; history records only keep the image id.
+    """
+    expire_after = IMAGE_RETENTION_DAYS * 86400
+    existing = (await db.images.index_information()).get("created_at_1")
+    if existing and existing.get("expireAfterSeconds") != expire_after:
+        if "expireAfterSeconds" in existing:
+            # MongoDB rejects create_index with changed options, but collMod updates TTLs in place
+            await db.command(
+                "collMod", "images",
+                index={"keyPattern": {"created_at": 1}, "expireAfterSeconds": expire_after}
+            )
+            logging.info(f"Updated images TTL to {IMAGE_RETENTION_DAYS} days")
+            return
+        await db.images.drop_index("created_at_1")
+    await db.images.create_index("created_at", expireAfterSeconds=expire_after)
+
+ARCHIVE_KINDS = {
+    "chat": "chat_messages",
+    "detection": "disease_detections"
+}
+
+async def store_image(farmer_id: str, image_data: str) -> str:
+    """Store a raw image in the TTL-indexed `images` collection and return its id"""
+    image_id = str(uuid.uuid4())
+    await db.images.insert_one({
+        "id": image_id,
+        "farmer_id": farmer_id,
+        "image_data": image_data,
+        "created_at": datetime.utcnow()
+    })
+    return image_id
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def compress_records(records: list) -> bytes:
+    return gzip.compress(json.dumps(records, default=_json_default).encode())
+
+def decompress_records(data: bytes) -> list:
+    return json.loads(gzip.decompress(data))
+
+async def append_to_archive(kind: str, farmer_id: str, month: str, records: list):
+    """Merge records into the compressed (kind, farmer, month) archive document
+
+    Every worker runs the archiver, so the write is conditional on the version that
+    was read; if another archiver got there first, the merge is redone on top of its
+    write. Returns only after a write has landed, so callers may then delete the records.
+    """
+    archive_id = f"{kind}:{farmer_id}:{month}"
+    new_records = json.loads(json.dumps(records, default=_json_default))
+    while True:
+        existing = await db.history_archives.find_one({"id": archive_id})
+        merged = decompress_records(existing["data"]) if existing else []
+        
+        # Records are only deleted after the archive is written, so a retry may repeat some
+        seen = {record["id"] for record in merged}
+        merged.extend(record for record in new_records if record["id"] not in seen)
+        merged.sort(key=lambda record: (record["created_at"], record["id"]))
+        
+        version = existing.get("version") if existing else None
+        archive = {
+            "id": archive_id,
+            "kind": kind,
+            "farmer_id": farmer_id,
+            "month": month,
+            "codec": "gzip",
+            "count": len(merged),
+            "data": compress_records(merged),
+            "version": (version or 0) + 1,
+            "updated_at": datetime.utcnow()
+        }
+        
+        if existing:
+            result = await db.history_archives.replace_one({"id": archive_id, "version": version}, archive)
+            if result.matched_count:
+                return
+        else:
+            try:
+                await db.history_archives.insert_one(archive)
+                return
+            except DuplicateKeyError:
+                pass
+        logging.info(f"Archive {archive_id} changed concurrently, merging again")
+
+async def archive_collection(kind: str, cutoff: datetime) -> int:
+    collection = db[ARCHIVE_KINDS[kind]]
+    archived = 0
+    while True:
+        # Inline images are past their own retention by now, so they are not archived
+        batch = await collection.find(
+            {"created_at": {"$lt": cutoff}},
+            {"_id": 0, "image_data": 0}
+        ).sort("created_at", 1).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+        if not batch:
+            return archived
+        
+        groups = {}
+        for record in batch:
+            key = (record["farmer_id"], record["created_at"].strftime("%Y-%m"))
+            groups.setdefault(key, []).append(record)
+        
+        for (farmer_id, month), records in groups.items():
+            await append_to_archive(kind, farmer_id, month, records)
+            await collection.delete_many({"id": {"$in": [record["id"] for record in records]}})
+        archived += len(batch)
+
+async def archive_history():
+    """Apply the retention policy once: drop expired inline images, archive old records"""
+    image_cutoff = datetime.utcnow() - timedelta(days=IMAGE_RETENTION_DAYS)
+    for collection_name in ARCHIVE_KINDS.values():
+        collection = db[collection_name]
+        await collection.update_many(
+            {"created_at": {"$lt": image_cutoff}, "image_data": {"$ne": None}},
+            {"$set": {"image_data": None}}
+        )
+    
+    history_cutoff = datetime.utcnow() - timedelta(days=HISTORY_RETENTION_DAYS)
+    for kind in ARCHIVE_KINDS:
+        archived = await archive_collection(kind, history_cutoff)
+        if archived:
+            logging.info(f"Archived {archived} {kind} records older than {history_cutoff}")
+
+async def run_archiver():
+    while True:
+        try:
+            await archive_history()
+        except Exception as e:
+            logging.error(f"Archiver error: {str(e)}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+async def read_archived_chat(
+    farmer_id: str,
+    session_id: Optional[str],
+    since: Optional[datetime],
+    before: Optional[datetime],
+    limit: int,
+    newest_first: bool = True,
+    after_id: Optional[str] = None
+) -> list:
+    """Read archived chat messages in order, decompressing only the months needed"""
+    # Stored timestamps are naive UTC; clients may send offset-aware cursors
+    if since and since.tzinfo:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    if before and before.tzinfo:
+        before = before.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    query = {"kind": "chat", "farmer_id": farmer_id}
+    month_range = {}
+    if since:
+        month_range["$gte"] = since.strftime("%Y-%m")
+    if before:
+        month_range["$lte"] = before.strftime("%Y-%m")
+    if month_range:
+        query["month"] = month_range
+    
+    messages = []
+    async for archive in db.history_archives.find(query).sort("month", -1 if newest_first else 1):
+        records = decompress_records(archive["data"])
+        for record in (reversed(records) if newest_first else records):
+            created_at = datetime.fromisoformat(record["created_at"])
+            if session_id and record.get("session_id") != session_id:
+                continue
+            if since and (created_at < since or (created_at == since and (not after_id or record["id"] <= after_id))):
+                continue
+            if before and created_at >= before:
+                continue
+            messages.append(record)
+            if len(messages) >= limit:
+                return messages
+    return messages
+
+# Daily advisory helpers
+async def generate_advisory(location: str, crop: str, date: str):
+    weather = await get_weather(location)
+    system_message = get_farming_system_message({
+        "name": f"Farmers in {location}",
+        "location": location,
+        "crops": [crop]
+    })
+    prompt = f"""Today's weather in {location}: {weather.temperature}°C, humidity {weather.humidity}%, rainfall {weather.rainfall}mm.
+    Forecast: {weather.forecast}
+    
+    Give {crop} farmers a short advisory for today covering:
+    1. Field work to do or avoid given the weather
+    2. Irrigation and drainage
+    3. Pest and disease risks to watch for
+    4. Fertilizer or harvest timing if relevant"""
+    
+    advisory_text = await call_llm(
+        "advisory",
+        f"advisory_{date}_{uuid.uuid4()}",
+        system_message,
+        UserMessage(text=prompt)
+    )
+    advisory = CropAdvisory(location=location, crop=crop, date=date, advisory=advisory_text, weather=weather)
+    await db.advisories.replace_one(
+        {"location": location, "crop": crop, "date": date},
+        advisory.dict(),
+        upsert=True
+    )
+
+async def generate_daily_advisories(date: Optional[str] = None) -> Tuple[int, int]:
+    """Generate today's advisory for every (location, crop) pair present in `farmers`
+
+    Pairs that already have an advisory for the date are skipped, so reruns only fill gaps.
+    Returns (generated, pending) so the scheduler can tell when a rerun is needed.
+    """
+    date = date or datetime.utcnow().strftime("%Y-%m-%d")
+    pipeline = [
+        {"$unwind": "$crops"},
+        {"$group": {"_id": {"location": "$location", "crop": "$crops"}}}
+    ]
+    pairs = [(row["_id"]["location"], row["_id"]["crop"]) async for row in db.farmers.aggregate(pipeline)]
+    done = {
+        (row["location"], row["crop"])
+        async for row in db.advisories.find({"date": date}, {"_id": 0, "location": 1, "crop": 1})
+    }
+    
+    semaphore = asyncio.Semaphore(ADVISORY_CONCURRENCY)
+    
+    async def generate(location: str, crop: str) -> bool:
+        async with semaphore:
+            try:
+                await generate_advisory(location, crop, date)
+                return True
+            except Exception as e:
+                logging.error(f"Advisory error for {crop} in {location}: {str(e)}")
+                return False
+    
+    results = await asyncio.gather(*[generate(location, crop) for location, crop in pairs if (location, crop) not in done])
+    logging.info(f"Generated {sum(results)} of {len(results)} pending advisories for {date}")
+    return sum(results), len(results)
+
+def seconds_until_next_advisory_run(now: datetime) -> float:
+    next_run = now.replace(hour=ADVISORY_HOUR_UTC, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+async def run_advisory_batch() -> float:
+    """Run one advisory batch and return the seconds to wait before the next one
+
+    Normally that is the next daily run; if any pair failed (e.g. the provider was
+    down) or the batch errored, the gaps are retried within the hour.
+    """
+    delay = 3600
+    try:
+        generated, pending = await generate_daily_advisories()
+        delay = seconds_until_next_advisory_run(datetime.utcnow())
+        if generated < pending:
+            delay = min(3600, delay)
+    except Exception as e:
+        logging.error(f"Advisory scheduler error: {str(e)}")
+    return delay
+
+async def run_advisory_scheduler():
+    # Catch up on startup, then run once a day at the configured hour
+    while True:
+        await asyncio.sleep(await run_advisory_batch())
+
 # API Routes
 @api_router.get("/")
 async def root():
@@ -203,10 +670,24 @@ async def create_farmer_profile(farmer_data: FarmerProfileCreate):
     return farmer_obj
 
 @api_router.get("/farmers/{farmer_id}", response_model=FarmerProfile)
-async def get_farmer_profile(farmer_id: str):
+async def get_farmer_profile(
+    farmer_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
+):
+    if if_none_match:
+        # Revalidation: check the version fields first so unchanged profiles never load the full document
+        version = await db.farmers.find_one(
+            {"id": farmer_id},
+            {"_id": 0, "id": 1, "created_at": 1, "updated_at": 1}
+        )
+        if version and etag_matches(if_none_match, farmer_etag(version)):
+            return not_modified(farmer_etag(version))
+    
     farmer = await db.farmers.find_one({"id": farmer_id})
     if not farmer:
         raise HTTPException(status_code=404, detail="Farmer not found")
+    response.headers["ETag"] = farmer_etag(farmer)
     return FarmerProfile(**farmer)
 
 @api_router.get("/farmers", response_model=List[FarmerProfile])
@@ -226,13 +707,17 @@ async def send_chat_message(chat_request: ChatRequest):
             chat_request.image_data
         )
         
-        # Save chat message
+        # Save chat message, keeping the raw image out of the history record
+        image_id = None
+        if chat_request.image_data:
+            image_id = await store_image(chat_request.farmer_id, chat_request.image_data)
+        
         chat_message = ChatMessage(
             farmer_id=chat_request.farmer_id,
             message=chat_request.message,
             response=ai_response,
             message_type=chat_request.message_type,
-            image_data=chat_request.image_data,
+            image_id=image_id,
             session_id=chat_request.session_id
         )
         
@@ -249,12 +734,61 @@ async def send_chat_message(chat_request: ChatRequest):
         raise HTTPException(status_code=500, detail="Failed to process message")
 
 @api_router.get("/chat/{farmer_id}")
-async def get_chat_history(farmer_id: str, session_id: Optional[str] = None):
+async def get_chat_history(
+    farmer_id: str,
+    response: Response,
+    session_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    after_id: Optional[str] = None,
+    before: Optional[datetime] = None,
+    if_none_match: Optional[str] = Header(None)
+):
     query = {"farmer_id": farmer_id}
     if session_id:
         query["session_id"] = session_id
+    if since:
+        # Delta polling: only messages after the client's latest (created_at, id)
+        query.update(after_cursor("created_at", since, after_id))
+    if before:
+        # Scrolling back: only messages older than the client's oldest one
+        query["created_at"] = {"$lt": before}
     
-    messages = await db.chat_messages.find(query).sort("created_at", -1).limit(50).to_list(50)
+    count, latest = await get_collection_version(db.chat_messages, query)
+    archive_count, archive_latest = await get_collection_version(
+        db.history_archives, {"kind": "chat", "farmer_id": farmer_id}, "updated_at"
+    )
+    etag = make_etag(farmer_id, session_id, since, after_id, before, count, latest, archive_count, archive_latest)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    
+    if since:
+        # Delta polls page forward oldest first, so a burst larger than one page is
+        # never skipped; X-Has-More tells the client to poll again with the last
+        # message's created_at and id as `since` and `after_id`
+        messages = []
+        if archive_count:
+            # Archived messages are always older than live ones, so they come first
+            messages = await read_archived_chat(
+                farmer_id, session_id, since, before, CHAT_PAGE_SIZE + 1,
+                newest_first=False, after_id=after_id
+            )
+        remaining = CHAT_PAGE_SIZE + 1 - len(messages)
+        if remaining > 0:
+            messages += await db.chat_messages.find(query).sort(
+                [("created_at", 1), ("id", 1)]
+            ).limit(remaining).to_list(remaining)
+        response.headers["ETag"] = etag
+        response.headers["X-Has-More"] = "true" if len(messages) > CHAT_PAGE_SIZE else "false"
+        return [ChatMessage(**msg) for msg in messages[:CHAT_PAGE_SIZE]]
+    
+    messages = await db.chat_messages.find(query).sort("created_at", -1).limit(CHAT_PAGE_SIZE).to_list(CHAT_PAGE_SIZE)
+    if len(messages) < CHAT_PAGE_SIZE and archive_count:
+        # Past the live retention window, continue the page from the archive
+        oldest = messages[-1]["created_at"] if messages else before
+        messages += await read_archived_chat(
+            farmer_id, session_id, since, oldest, CHAT_PAGE_SIZE - len(messages)
+        )
+    response.headers["ETag"] = etag
     return [ChatMessage(**msg) for msg in messages]
 
 # Disease Detection Route
@@ -276,10 +810,10 @@ async def detect_plant_disease(farmer_id: str, image_data: str, description: str
         session_id = f"disease_{farmer_id}_{uuid.uuid4()}"
         ai_response = await get_ai_response(analysis_prompt, farmer_id, session_id, image_data)
         
-        # Save disease detection record
+        # Save disease detection record, keeping the raw image out of the history record
         detection = DiseaseDetection(
             farmer_id=farmer_id,
-            image_data=image_data,
+            image_id=await store_image(farmer_id, image_data),
             detected_disease="AI Analysis",
             confidence=0.8,  # Placeholder
             treatment_advice=ai_response
@@ -297,6 +831,14 @@ async def detect_plant_disease(farmer_id: str, image_data: str, description: str
         logging.error(f"Disease detection error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to analyze plant image")
 
+# Image Route
+@api_router.get("/images/{image_id}")
+async def get_image(image_id: str):
+    image = await db.images.find_one({"id": image_id}, {"_id": 0})
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found or past retention")
+    return image
+
 # Weather Route (Mock data for now)
 @api_router.get("/weather/{location}")
 async def get_weather(location: str):
@@ -312,6 +854,33 @@ async def get_weather(location: str):
     
     return weather
 
+# Advisory Route
+@api_router.get("/advisories/{farmer_id}", response_model=List[CropAdvisory])
+async def get_farmer_advisories(
+    farmer_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
+):
+    farmer = await db.farmers.find_one({"id": farmer_id}, {"_id": 0, "location": 1, "crops": 1})
+    if not farmer:
+        raise HTTPException(status_code=404, detail="Farmer not found")
+    
+    # Latest advisory per crop, so new days fall back to yesterday's until the batch runs
+    pipeline = [
+        {"$match": {"location": farmer["location"], "crop": {"$in": farmer.get("crops", [])}}},
+        {"$sort": {"date": -1}},
+        {"$group": {"_id": "$crop", "advisory": {"$first": "$$ROOT"}}}
+    ]
+    rows = await db.advisories.aggregate(pipeline).to_list(None)
+    advisories = sorted((row["advisory"] for row in rows), key=lambda advisory: advisory["crop"])
+    
+    etag = make_etag(farmer_id, *[advisory["id"] for advisory in advisories])
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    
+    response.headers["ETag"] = etag
+    return [CropAdvisory(**advisory) for advisory in advisories]
+
 # Officer Escalation Route
 @api_router.post("/escalate")
 async def escalate_to_officer(farmer_id: str, query: str, priority: str = "medium"):
@@ -332,8 +901,33 @@ async def escalate_to_officer(farmer_id: str, query: str, priority: str = "mediu
     }
 
 @api_router.get("/escalations/{farmer_id}")
-async def get_farmer_escalations(farmer_id: str):
-    escalations = await db.escalations.find({"farmer_id": farmer_id}).to_list(20)
+async def get_farmer_escalations(
+    farmer_id: str,
+    response: Response,
+    since: Optional[datetime] = None,
+    after_id: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    query = {"farmer_id": farmer_id}
+    if since:
+        # Status changes bump updated_at, so they show up in the delta too
+        query.update(after_cursor("updated_at", since, after_id))
+    
+    count, latest = await get_collection_version(db.escalations, query, "updated_at")
+    etag = make_etag(farmer_id, since, after_id, count, latest)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    
+    if since:
+        # Page forward oldest change first so nothing is skipped when more than a page changed
+        escalations = await db.escalations.find(query).sort(
+            [("updated_at", 1), ("id", 1)]
+        ).limit(ESCALATION_PAGE_SIZE + 1).to_list(ESCALATION_PAGE_SIZE + 1)
+        response.headers["X-Has-More"] = "true" if len(escalations) > ESCALATION_PAGE_SIZE else "false"
+        escalations = escalations[:ESCALATION_PAGE_SIZE]
+    else:
+        escalations = await db.escalations.find(query).to_list(ESCALATION_PAGE_SIZE)
+    response.headers["ETag"] = etag
     return [OfficerEscalation(**esc) for esc in escalations]
 
 # Translation Route
@@ -353,6 +947,9 @@ async def translate_text_endpoint(translation_request: TranslationRequest):
             target_language=translation_request.target_language
         )
         
+    except LlmUnavailableError as e:
+        logging.error(f"Translation unavailable: {str(e)}")
+        raise HTTPException(status_code=503, detail="Translation is temporarily unavailable. Please try again shortly.")
     except Exception as e:
         logging.error(f"Translation endpoint error: {str(e)}")
         raise HTTPException(status_code=500, detail="Translation failed")
@@ -367,6 +964,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Has-More"],
 )
 
 # Configure logging
@@ -376,8 +974,38 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    # Indexes backing the ETag version checks and `since` delta queries
+    await db.farmers.create_index("id")
+    await db.chat_messages.create_index([("farmer_id", 1), ("created_at", -1), ("id", -1)])
+    await db.chat_messages.create_index([("farmer_id", 1), ("session_id", 1), ("created_at", -1), ("id", -1)])
+    await db.escalations.create_index([("farmer_id", 1), ("updated_at", -1), ("id", -1)])
+    await db.chat_messages.create_index("created_at")
+    await db.disease_detections.create_index("created_at")
+    await db.history_archives.create_index("id", unique=True)
+    await db.history_archives.create_index([("kind", 1), ("farmer_id", 1), ("month", -1), ("updated_at", -1)])
+    await db.images.create_index("id")
+    await ensure_image_ttl_index()
+    await db.advisories.create_index([("location", 1), ("crop", 1), ("date", -1)], unique=True)
+    await db.advisories.create_index("date")
+
+@app.on_event("startup")
+async def start_archiver():
+    if HISTORY_RETENTION_DAYS > 0:
+        app.state.archiver_task = asyncio.create_task(run_archiver())
+
+@app.on_event("startup")
+async def start_advisory_scheduler():
+    if ADVISORY_HOUR_UTC >= 0:
+        app.state.advisory_task = asyncio.create_task(run_advisory_scheduler())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task_name in ("archiver_task", "advisory_task"):
+        task = getattr(app.state, task_name, None)
+        if task:
+            task.cancel()
     client.close()
 
 if __name__ == "__main__":
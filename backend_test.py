@@ -214,6 +214,37 @@ class FarmingAssistantTester:
         except Exception as e:
             self.log_result("Chat History", False, f"Error: {str(e)}")
     
+    def test_chat_image_storage(self):
+        """Test that chat images are stored separately and history pages backwards"""
+        if not self.test_farmer_id:
+            self.log_result("Chat Image Storage", False, "No farmer ID available")
+            return
+        
+        try:
+            response = requests.get(f"{API_BASE}/chat/{self.test_farmer_id}", timeout=10)
+            messages = response.json()
+            with_image = [msg for msg in messages if msg.get('image_id')]
+            if not with_image:
+                self.log_result("Chat Image Storage", False, f"No message with image_id in: {messages}")
+                return
+            if with_image[0].get('image_data'):
+                self.log_result("Chat Image Storage", False, "History record still carries inline image data")
+                return
+            
+            image = requests.get(f"{API_BASE}/images/{with_image[0]['image_id']}", timeout=10)
+            if image.status_code != 200 or not image.json().get('image_data'):
+                self.log_result("Chat Image Storage", False, f"Image fetch status: {image.status_code}")
+                return
+            
+            oldest = messages[-1]['created_at']
+            older = requests.get(f"{API_BASE}/chat/{self.test_farmer_id}", params={"before": oldest}, timeout=10)
+            if older.status_code == 200 and all(msg['created_at'] < oldest for msg in older.json()):
+                self.log_result("Chat Image Storage", True, f"Image {with_image[0]['image_id']} served separately")
+            else:
+                self.log_result("Chat Image Storage", False, f"Paging back returned: {older.status_code} {older.text}")
+        except Exception as e:
+            self.log_result("Chat Image Storage", False, f"Error: {str(e)}")
+    
     def test_disease_detection(self):
         """Test plant disease detection API"""
         if not self.test_farmer_id:
@@ -261,6 +292,25 @@ class FarmingAssistantTester:
             except Exception as e:
                 self.log_result(f"Weather API ({location})", False, f"Error: {str(e)}")
     
+    def test_get_advisories(self):
+        """Test retrieving precomputed daily crop advisories"""
+        if not self.test_farmer_id:
+            self.log_result("Get Advisories", False, "No farmer ID available")
+            return
+        
+        try:
+            response = requests.get(f"{API_BASE}/advisories/{self.test_farmer_id}", timeout=10)
+            if response.status_code == 200:
+                data = response.json()
+                if isinstance(data, list) and all('advisory' in item and 'crop' in item for item in data):
+                    self.log_result("Get Advisories", True, f"Retrieved {len(data)} advisories")
+                else:
+                    self.log_result("Get Advisories", False, f"Unexpected response: {data}")
+            else:
+                self.log_result("Get Advisories", False, f"Status: {response.status_code}")
+        except Exception as e:
+            self.log_result("Get Advisories", False, f"Error: {str(e)}")
+    
     def test_escalate_to_officer(self):
         """Test escalating farmer query to agriculture officer"""
         if not self.test_farmer_id:
@@ -305,6 +355,34 @@ class FarmingAssistantTester:
         except Exception as e:
             self.log_result("Get Escalations", False, f"Error: {str(e)}")
     
+    def test_conditional_get(self):
+        """Test ETag / If-None-Match handling and delta polling on chat history"""
+        if not self.test_farmer_id:
+            self.log_result("Conditional GET", False, "No farmer ID available")
+            return
+        
+        try:
+            for path in [f"farmers/{self.test_farmer_id}", f"chat/{self.test_farmer_id}", f"escalations/{self.test_farmer_id}"]:
+                first = requests.get(f"{API_BASE}/{path}", timeout=10)
+                etag = first.headers.get('ETag')
+                if first.status_code != 200 or not etag:
+                    self.log_result("Conditional GET", False, f"{path}: status {first.status_code}, ETag {etag}")
+                    return
+                
+                second = requests.get(f"{API_BASE}/{path}", headers={"If-None-Match": etag}, timeout=10)
+                if second.status_code != 304:
+                    self.log_result("Conditional GET", False, f"{path}: expected 304, got {second.status_code}")
+                    return
+            
+            since = datetime.utcnow().isoformat()
+            response = requests.get(f"{API_BASE}/chat/{self.test_farmer_id}", params={"since": since}, timeout=10)
+            if response.status_code == 200 and response.json() == []:
+                self.log_result("Conditional GET", True, "304 returned for unchanged resources, empty delta for since")
+            else:
+                self.log_result("Conditional GET", False, f"Delta poll returned: {response.status_code} {response.text}")
+        except Exception as e:
+            self.log_result("Conditional GET", False, f"Error: {str(e)}")
+    
     def run_all_tests(self):
         """Run all backend API tests"""
         print("🌾 Starting AI Farming Assistant Backend API Tests")
@@ -319,10 +397,13 @@ class FarmingAssistantTester:
         self.test_chat_english()
         self.test_chat_with_image()
         self.test_chat_history()
+        self.test_chat_image_storage()
         self.test_disease_detection()
         self.test_weather_api()
+        self.test_get_advisories()
         self.test_escalate_to_officer()
         self.test_get_escalations()
+        self.test_conditional_get()
         
         # Print summary
         print("\n" + "=" * 60)
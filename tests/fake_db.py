@@ -0,0 +1,249 @@
+"""
+In-memory stand-in for the Motor database used by server.py
+Implements only the query, update and aggregation features the backend relies on
+"""
+
+import copy
+from types import SimpleNamespace
+
+from pymongo.errors import DuplicateKeyError
+
+
+def _get(document, field):
+    value = document
+    for part in field.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _compare(value, operator, operand):
+    if operator == "$in":
+        return value in operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$exists":
+        return (value is not None) == operand
+    if value is None:
+        return False
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    raise NotImplementedError(operator)
+
+
+def matches(document, query):
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches(document, clause) for clause in condition):
+                return False
+            continue
+        value = _get(document, field)
+        if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+            if not all(_compare(value, operator, operand) for operator, operand in condition.items()):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def project(document, projection):
+    document = copy.deepcopy(document)
+    if not projection:
+        return document
+    included = [field for field, flag in projection.items() if flag and field != "_id"]
+    if included:
+        document = {field: document[field] for field in included if field in document}
+    else:
+        for field, flag in projection.items():
+            if not flag:
+                document.pop(field, None)
+    if projection.get("_id") == 0:
+        document.pop("_id", None)
+    return document
+
+
+def _sort_key(value):
+    # Missing values sort first, as in MongoDB
+    return (value is not None, value)
+
+
+def sort_documents(documents, keys):
+    for field, direction in reversed(keys):
+        documents.sort(key=lambda document: _sort_key(_get(document, field)), reverse=direction < 0)
+    return documents
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+        self._limit = None
+
+    def sort(self, key, direction=1):
+        if isinstance(key, dict):
+            keys = list(key.items())
+        elif isinstance(key, list):
+            keys = key
+        else:
+            keys = [(key, direction)]
+        sort_documents(self.documents, keys)
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def _results(self):
+        return self.documents[:self._limit] if self._limit else self.documents
+
+    async def to_list(self, length=None):
+        results = self._results()
+        return results[:length] if length else results
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._results():
+            yield document
+
+
+def _evaluate(expression, document):
+    if expression == "$$ROOT":
+        return copy.deepcopy(document)
+    if isinstance(expression, str) and expression.startswith("$"):
+        return _get(document, expression[1:])
+    if isinstance(expression, dict):
+        return {key: _evaluate(value, document) for key, value in expression.items()}
+    return expression
+
+
+def _group(documents, spec):
+    groups = {}
+    for document in documents:
+        group_id = _evaluate(spec["_id"], document)
+        key = repr(group_id)
+        if key not in groups:
+            groups[key] = {"_id": group_id}
+        group = groups[key]
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (operator, expression), = accumulator.items()
+            value = _evaluate(expression, document)
+            if operator == "$sum":
+                group[field] = group.get(field, 0) + value
+            elif operator == "$max":
+                if field not in group or (value is not None and (group[field] is None or value > group[field])):
+                    group[field] = value
+            elif operator == "$first":
+                group.setdefault(field, value)
+            else:
+                raise NotImplementedError(operator)
+    return list(groups.values())
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.documents = []
+        self.indexes = {}
+
+    async def insert_one(self, document):
+        for name, index in self.indexes.items():
+            if index.get("unique"):
+                fields = [field for field, _ in index["key"]]
+                if any(all(_get(existing, field) == _get(document, field) for field in fields) for existing in self.documents):
+                    raise DuplicateKeyError(f"E11000 duplicate key error index: {name}")
+        self.documents.append(copy.deepcopy(document))
+
+    async def find_one(self, query, projection=None):
+        for document in self.documents:
+            if matches(document, query):
+                return project(document, projection)
+        return None
+
+    def find(self, query=None, projection=None):
+        return FakeCursor([project(document, projection) for document in self.documents if matches(document, query or {})])
+
+    async def replace_one(self, query, replacement, upsert=False):
+        for index, document in enumerate(self.documents):
+            if matches(document, query):
+                self.documents[index] = copy.deepcopy(replacement)
+                return SimpleNamespace(matched_count=1)
+        if upsert:
+            self.documents.append(copy.deepcopy(replacement))
+        return SimpleNamespace(matched_count=0)
+
+    async def update_many(self, query, update):
+        for document in self.documents:
+            if matches(document, query):
+                document.update(copy.deepcopy(update["$set"]))
+
+    async def delete_many(self, query):
+        self.documents = [document for document in self.documents if not matches(document, query)]
+
+    def aggregate(self, pipeline):
+        documents = copy.deepcopy(self.documents)
+        for stage in pipeline:
+            (operator, spec), = stage.items()
+            if operator == "$match":
+                documents = [document for document in documents if matches(document, spec)]
+            elif operator == "$unwind":
+                field = spec[1:]
+                documents = [
+                    {**document, field: item}
+                    for document in documents
+                    for item in (document.get(field) or [])
+                ]
+            elif operator == "$group":
+                documents = _group(documents, spec)
+            elif operator == "$sort":
+                documents = sort_documents(documents, list(spec.items()))
+            else:
+                raise NotImplementedError(operator)
+        return FakeCursor(documents)
+
+    async def index_information(self):
+        return copy.deepcopy(self.indexes)
+
+    async def create_index(self, keys, **options):
+        keys = [(keys, 1)] if isinstance(keys, str) else keys
+        name = "_".join(f"{field}_{direction}" for field, direction in keys)
+        existing = self.indexes.get(name)
+        if existing and any(existing.get(option) != value for option, value in options.items()):
+            raise RuntimeError(f"IndexOptionsConflict on {name}")
+        self.indexes[name] = {"key": keys, **options}
+        return name
+
+    async def drop_index(self, name):
+        del self.indexes[name]
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections = {}
+        self.commands = []
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(name)
+        return self.collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, name, collection, **options):
+        self.commands.append((name, collection, options))
+        if name == "collMod":
+            index = options["index"]
+            field, direction = next(iter(index["keyPattern"].items()))
+            self[collection].indexes[f"{field}_{direction}"]["expireAfterSeconds"] = index["expireAfterSeconds"]
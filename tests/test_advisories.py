@@ -0,0 +1,99 @@
+"""
+Daily advisory batch tests against an in-memory database and a stubbed LLM
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import Response
+
+import server
+
+FARMERS = [
+    {"id": "f1", "name": "Rajesh", "location": "Kochi", "crops": ["paddy", "pepper"]},
+    {"id": "f2", "name": "Lakshmi", "location": "Kochi", "crops": ["paddy"]},
+    {"id": "f3", "name": "Joseph", "location": "Thrissur", "crops": ["coconut"]}
+]
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def llm_calls(fake_db, monkeypatch):
+    calls = []
+
+    async def fake_call_llm(purpose, session_id, system_message, user_message):
+        calls.append((purpose, system_message, user_message.text))
+        return f"advisory {len(calls)}"
+
+    monkeypatch.setattr(server, "call_llm", fake_call_llm)
+    for farmer in FARMERS:
+        run(fake_db.farmers.insert_one(farmer))
+    return calls
+
+
+def test_one_advisory_per_location_and_crop(fake_db, llm_calls):
+    assert run(server.generate_daily_advisories("2026-10-19")) == (3, 3)
+
+    pairs = sorted((advisory["location"], advisory["crop"]) for advisory in fake_db.advisories.documents)
+    assert pairs == [("Kochi", "paddy"), ("Kochi", "pepper"), ("Thrissur", "coconut")]
+    assert all(purpose == "advisory" for purpose, _, _ in llm_calls)
+    assert any("Location: Thrissur" in system and "coconut" in prompt for _, system, prompt in llm_calls)
+
+
+def test_rerun_for_same_date_generates_nothing(fake_db, llm_calls):
+    run(server.generate_daily_advisories("2026-10-19"))
+    assert run(server.generate_daily_advisories("2026-10-19")) == (0, 0)
+    assert len(llm_calls) == 3
+    assert len(fake_db.advisories.documents) == 3
+
+
+def test_farmer_advisories_return_latest_per_crop(fake_db, llm_calls):
+    run(server.generate_daily_advisories("2026-10-18"))
+    run(server.generate_daily_advisories("2026-10-19"))
+
+    response = Response()
+    advisories = run(server.get_farmer_advisories("f1", response, None))
+    assert [(advisory.crop, advisory.date) for advisory in advisories] == [
+        ("paddy", "2026-10-19"), ("pepper", "2026-10-19")
+    ]
+    assert run(server.get_farmer_advisories("f1", Response(), response.headers["ETag"])).status_code == 304
+
+
+def test_next_run_is_scheduled_at_configured_hour(monkeypatch):
+    monkeypatch.setattr(server, "ADVISORY_HOUR_UTC", 0)
+    assert server.seconds_until_next_advisory_run(datetime(2026, 10, 19, 23, 0)) == 3600
+    assert server.seconds_until_next_advisory_run(datetime(2026, 10, 19, 0, 0)) == 86400
+
+
+def test_failed_pair_is_retried_within_the_hour(fake_db, llm_calls, monkeypatch):
+    stub = server.call_llm
+    provider_down_for = {"pepper"}
+
+    async def flaky_call_llm(purpose, session_id, system_message, user_message):
+        if any(crop in user_message.text for crop in provider_down_for):
+            raise server.LlmUnavailableError("provider down")
+        return await stub(purpose, session_id, system_message, user_message)
+
+    monkeypatch.setattr(server, "call_llm", flaky_call_llm)
+    monkeypatch.setattr(server, "seconds_until_next_advisory_run", lambda now: 50000)
+
+    assert run(server.run_advisory_batch()) == 3600
+    assert sorted(advisory["crop"] for advisory in fake_db.advisories.documents) == ["coconut", "paddy"]
+
+    # The provider recovers: the next run fills only the gap and goes back to the daily schedule
+    provider_down_for.clear()
+    assert run(server.run_advisory_batch()) == 50000
+    assert sorted(advisory["crop"] for advisory in fake_db.advisories.documents) == ["coconut", "paddy", "pepper"]
+    assert len(llm_calls) == 3
+
+
+def test_failed_batch_keeps_scheduler_alive(fake_db, monkeypatch):
+    async def broken_batch(date=None):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(server, "generate_daily_advisories", broken_batch)
+    assert run(server.run_advisory_batch()) == 3600
@@ -0,0 +1,206 @@
+"""
+Retention and archival tests against an in-memory database
+Covers compressed monthly archives, crash-safe re-archiving and chat history paging
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import Response
+
+import server
+
+FARMER_ID = "farmer-1"
+
+
+def chat_record(record_id, created_at, session_id="session-1", farmer_id=FARMER_ID):
+    return {
+        "id": record_id,
+        "farmer_id": farmer_id,
+        "message": f"question {record_id}",
+        "response": f"answer {record_id}",
+        "message_type": "text",
+        "image_data": "aW1hZ2U=",
+        "image_id": None,
+        "created_at": created_at,
+        "session_id": session_id
+    }
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def archived_records(fake_db, archive_id):
+    archive = run(fake_db.history_archives.find_one({"id": archive_id}))
+    return server.decompress_records(archive["data"])
+
+
+def test_append_to_archive_merges_dedups_and_sorts(fake_db):
+    first = [chat_record("b", datetime(2026, 1, 20)), chat_record("a", datetime(2026, 1, 5))]
+    run(server.append_to_archive("chat", FARMER_ID, "2026-01", first))
+    # A retry repeats "b" alongside a new record
+    second = [chat_record("b", datetime(2026, 1, 20)), chat_record("c", datetime(2026, 1, 10))]
+    run(server.append_to_archive("chat", FARMER_ID, "2026-01", second))
+
+    records = archived_records(fake_db, f"chat:{FARMER_ID}:2026-01")
+    assert [record["id"] for record in records] == ["a", "c", "b"]
+    archive = run(fake_db.history_archives.find_one({"id": f"chat:{FARMER_ID}:2026-01"}))
+    assert archive["count"] == 3 and archive["codec"] == "gzip"
+
+
+def test_archive_collection_groups_by_farmer_and_month(fake_db):
+    for record in [
+        chat_record("jan", datetime(2026, 1, 15)),
+        chat_record("feb", datetime(2026, 2, 15)),
+        chat_record("other", datetime(2026, 2, 16), farmer_id="farmer-2"),
+        chat_record("live", datetime(2026, 5, 1))
+    ]:
+        run(fake_db.chat_messages.insert_one(record))
+
+    archived = run(server.archive_collection("chat", datetime(2026, 3, 1)))
+
+    assert archived == 3
+    assert [record["id"] for record in fake_db.chat_messages.documents] == ["live"]
+    assert sorted(archive["id"] for archive in fake_db.history_archives.documents) == [
+        f"chat:{FARMER_ID}:2026-01", f"chat:{FARMER_ID}:2026-02", "chat:farmer-2:2026-02"
+    ]
+    # Inline images are dropped rather than archived
+    assert "image_data" not in archived_records(fake_db, f"chat:{FARMER_ID}:2026-01")[0]
+
+
+def test_rearchive_after_crash_between_write_and_delete(fake_db, monkeypatch):
+    for day in range(1, 4):
+        run(fake_db.chat_messages.insert_one(chat_record(f"m{day}", datetime(2026, 1, day))))
+
+    real_delete_many = fake_db.chat_messages.delete_many
+
+    async def crash(query):
+        raise RuntimeError("process killed")
+
+    monkeypatch.setattr(fake_db.chat_messages, "delete_many", crash)
+    with pytest.raises(RuntimeError):
+        run(server.archive_collection("chat", datetime(2026, 2, 1)))
+    assert len(fake_db.chat_messages.documents) == 3
+
+    monkeypatch.setattr(fake_db.chat_messages, "delete_many", real_delete_many)
+    assert run(server.archive_collection("chat", datetime(2026, 2, 1))) == 3
+
+    assert fake_db.chat_messages.documents == []
+    records = archived_records(fake_db, f"chat:{FARMER_ID}:2026-01")
+    assert [record["id"] for record in records] == ["m1", "m2", "m3"]
+
+
+@pytest.mark.parametrize("existing_archive", [True, False])
+def test_interleaved_archivers_lose_no_records(fake_db, monkeypatch, existing_archive):
+    run(server.create_indexes())
+    monkeypatch.setattr(server, "ARCHIVE_BATCH_SIZE", 2)
+    if existing_archive:
+        run(server.append_to_archive("chat", FARMER_ID, "2026-01", [chat_record("m0", datetime(2026, 1, 1))]))
+    for day in range(2, 6):
+        run(fake_db.chat_messages.insert_one(chat_record(f"m{day}", datetime(2026, 1, day))))
+
+    archives = fake_db.history_archives
+    real_find_one = archives.find_one
+    interleaved = []
+
+    async def find_one_then_let_other_worker_run(query, projection=None):
+        snapshot = await real_find_one(query, projection)
+        if not interleaved:
+            interleaved.append(True)
+            # Worker A archives and deletes every batch while B holds a stale read
+            await server.archive_collection("chat", datetime(2026, 2, 1))
+        return snapshot
+
+    monkeypatch.setattr(archives, "find_one", find_one_then_let_other_worker_run)
+    run(server.archive_collection("chat", datetime(2026, 2, 1)))
+
+    assert interleaved and fake_db.chat_messages.documents == []
+    expected = ["m0"] if existing_archive else []
+    records = archived_records(fake_db, f"chat:{FARMER_ID}:2026-01")
+    assert [record["id"] for record in records] == expected + ["m2", "m3", "m4", "m5"]
+
+
+def test_read_archived_chat_filters_and_prunes_months(fake_db):
+    run(fake_db.chat_messages.insert_one(chat_record("jan-a", datetime(2026, 1, 10), session_id="a")))
+    run(fake_db.chat_messages.insert_one(chat_record("jan-b", datetime(2026, 1, 20), session_id="b")))
+    run(fake_db.chat_messages.insert_one(chat_record("feb-a", datetime(2026, 2, 10), session_id="a")))
+    run(server.archive_collection("chat", datetime(2026, 3, 1)))
+    # Months outside the cursor range must not be decompressed at all
+    run(fake_db.history_archives.insert_one({
+        "id": f"chat:{FARMER_ID}:2025-06", "kind": "chat", "farmer_id": FARMER_ID,
+        "month": "2025-06", "data": b"not gzip", "updated_at": datetime(2026, 3, 1)
+    }))
+
+    by_session = run(server.read_archived_chat(FARMER_ID, "a", datetime(2026, 1, 1), None, 10))
+    assert [record["id"] for record in by_session] == ["feb-a", "jan-a"]
+
+    window = run(server.read_archived_chat(FARMER_ID, None, datetime(2026, 1, 10), datetime(2026, 2, 10), 10))
+    assert [record["id"] for record in window] == ["jan-b"]
+
+    # 2026-01-20 05:30 IST is 2026-01-20 00:00 UTC, which excludes jan-b at 00:00 UTC
+    ist = timezone(timedelta(hours=5, minutes=30))
+    aware = run(server.read_archived_chat(
+        FARMER_ID, None, datetime(2026, 1, 1, tzinfo=ist), datetime(2026, 1, 20, 5, 30, tzinfo=ist), 10
+    ))
+    assert [record["id"] for record in aware] == ["jan-a"]
+
+    oldest_first = run(server.read_archived_chat(FARMER_ID, None, datetime(2026, 1, 1), None, 2, newest_first=False))
+    assert [record["id"] for record in oldest_first] == ["jan-a", "jan-b"]
+
+
+def history(**params):
+    response = Response()
+    result = run(server.get_chat_history(FARMER_ID, response, **{
+        "session_id": None, "since": None, "after_id": None, "before": None, "if_none_match": None, **params
+    }))
+    return result, response
+
+
+def test_chat_history_pages_from_live_into_archive(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "CHAT_PAGE_SIZE", 3)
+    records = [chat_record(f"jan{day}", datetime(2026, 1, day)) for day in range(1, 4)]
+    records += [chat_record(f"feb{day}", datetime(2026, 2, day)) for day in range(1, 4)]
+    records += [chat_record(f"live{day}", datetime(2026, 5, day)) for day in range(1, 4)]
+    for record in records:
+        run(fake_db.chat_messages.insert_one(record))
+    run(server.archive_collection("chat", datetime(2026, 3, 1)))
+
+    live_page, response = history()
+    assert [message.id for message in live_page] == ["live3", "live2", "live1"]
+    not_modified, _ = history(if_none_match=response.headers["ETag"])
+    assert not_modified.status_code == 304
+
+    archive_page, _ = history(before=live_page[-1].created_at)
+    assert [message.id for message in archive_page] == ["feb3", "feb2", "feb1"]
+
+    older_page, _ = history(before=archive_page[-1].created_at)
+    assert [message.id for message in older_page] == ["jan3", "jan2", "jan1"]
+
+    last_page, _ = history(before=older_page[-1].created_at)
+    assert last_page == []
+
+
+def test_chat_history_since_pages_forward(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "CHAT_PAGE_SIZE", 2)
+    for day in range(1, 6):
+        run(fake_db.chat_messages.insert_one(chat_record(f"m{day}", datetime(2026, 5, day))))
+
+    first, response = history(since=datetime(2026, 5, 1))
+    assert [message.id for message in first] == ["m2", "m3"]
+    assert response.headers["X-Has-More"] == "true"
+
+    second, response = history(since=first[-1].created_at)
+    assert [message.id for message in second] == ["m4", "m5"]
+    assert response.headers["X-Has-More"] == "false"
+
+
+def test_image_ttl_index_follows_retention_setting(fake_db, monkeypatch):
+    run(server.ensure_image_ttl_index())
+    assert fake_db.images.indexes["created_at_1"]["expireAfterSeconds"] == server.IMAGE_RETENTION_DAYS * 86400
+
+    monkeypatch.setattr(server, "IMAGE_RETENTION_DAYS", 7)
+    run(server.ensure_image_ttl_index())
+    assert fake_db.images.indexes["created_at_1"]["expireAfterSeconds"] == 7 * 86400
+    assert fake_db.commands[0][0] == "collMod"
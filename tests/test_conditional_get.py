@@ -0,0 +1,139 @@
+"""
+Conditional GET and delta polling tests against an in-memory database
+Covers ETag matching, 304 responses and keyset paging of `since` deltas
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException, Response
+
+import server
+
+FARMER_ID = "farmer-1"
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def farmer(updated_at=datetime(2026, 10, 1)):
+    return {
+        "id": FARMER_ID,
+        "name": "Rajesh",
+        "phone": "+91-9876543210",
+        "location": "Kochi",
+        "crops": ["paddy"],
+        "farm_size": "2 acres",
+        "created_at": datetime(2026, 9, 1),
+        "updated_at": updated_at
+    }
+
+
+def escalation(escalation_id, updated_at):
+    return {
+        "id": escalation_id,
+        "farmer_id": FARMER_ID,
+        "query": f"query {escalation_id}",
+        "priority": "medium",
+        "status": "pending",
+        "created_at": datetime(2026, 9, 1),
+        "updated_at": updated_at
+    }
+
+
+def test_etag_matches_handles_lists_weak_tags_and_wildcard():
+    etag = server.make_etag("a", 1)
+    assert server.etag_matches(etag, etag)
+    assert server.etag_matches(f'"other", W/{etag}', etag)
+    assert server.etag_matches("*", etag)
+    assert not server.etag_matches('"other"', etag)
+    assert not server.etag_matches(None, etag)
+
+
+def test_farmer_profile_revalidates_with_304(fake_db):
+    run(fake_db.farmers.insert_one(farmer()))
+
+    response = Response()
+    profile = run(server.get_farmer_profile(FARMER_ID, response, None))
+    assert profile.id == FARMER_ID
+    etag = response.headers["ETag"]
+
+    assert run(server.get_farmer_profile(FARMER_ID, Response(), etag)).status_code == 304
+
+    # Any change to updated_at invalidates the tag
+    fake_db.farmers.documents[0]["updated_at"] = datetime(2026, 10, 2)
+    changed = Response()
+    assert run(server.get_farmer_profile(FARMER_ID, changed, etag)).id == FARMER_ID
+    assert changed.headers["ETag"] != etag
+
+
+def test_missing_farmer_is_404_even_when_revalidating(fake_db):
+    with pytest.raises(HTTPException) as error:
+        run(server.get_farmer_profile("missing", Response(), server.make_etag("missing", None)))
+    assert error.value.status_code == 404
+
+
+def escalations(**params):
+    response = Response()
+    result = run(server.get_farmer_escalations(FARMER_ID, response, **{
+        "since": None, "after_id": None, "if_none_match": None, **params
+    }))
+    return result, response
+
+
+def test_escalation_delta_pages_forward_oldest_first(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "ESCALATION_PAGE_SIZE", 2)
+    for day in [4, 2, 5, 3, 1]:
+        run(fake_db.escalations.insert_one(escalation(f"e{day}", datetime(2026, 10, day))))
+
+    first, response = escalations(since=datetime(2026, 10, 1))
+    assert [item.id for item in first] == ["e2", "e3"]
+    assert response.headers["X-Has-More"] == "true"
+
+    second, response = escalations(since=first[-1].updated_at, after_id=first[-1].id)
+    assert [item.id for item in second] == ["e4", "e5"]
+    assert response.headers["X-Has-More"] == "false"
+
+    _, full = escalations()
+    assert escalations(if_none_match=full.headers["ETag"])[0].status_code == 304
+
+
+def test_escalation_delta_keeps_ties_on_page_boundary(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "ESCALATION_PAGE_SIZE", 2)
+    # A bulk status change gives several escalations the same updated_at
+    bulk = datetime(2026, 10, 5, 12, 0)
+    for escalation_id in ["c", "a", "d", "b"]:
+        run(fake_db.escalations.insert_one(escalation(escalation_id, bulk)))
+
+    seen = []
+    since, after_id = datetime(2026, 10, 1), None
+    while True:
+        page, response = escalations(since=since, after_id=after_id)
+        seen += [item.id for item in page]
+        if response.headers["X-Has-More"] == "false":
+            break
+        since, after_id = page[-1].updated_at, page[-1].id
+    assert seen == ["a", "b", "c", "d"]
+
+
+def test_chat_delta_keeps_ties_on_page_boundary(fake_db, monkeypatch):
+    monkeypatch.setattr(server, "CHAT_PAGE_SIZE", 2)
+    same_time = datetime(2026, 10, 5, 12, 0)
+    for message_id in ["m3", "m1", "m2"]:
+        run(fake_db.chat_messages.insert_one({
+            "id": message_id, "farmer_id": FARMER_ID, "message": "q", "response": "r",
+            "created_at": same_time, "session_id": "s"
+        }))
+
+    common = {"session_id": None, "before": None, "if_none_match": None}
+    first_response = Response()
+    first = run(server.get_chat_history(
+        FARMER_ID, first_response, since=datetime(2026, 10, 1), after_id=None, **common
+    ))
+    assert [message.id for message in first] == ["m1", "m2"]
+    second = run(server.get_chat_history(
+        FARMER_ID, Response(), since=first[-1].created_at, after_id=first[-1].id, **common
+    ))
+    assert [message.id for message in second] == ["m3"]
@@ -0,0 +1,174 @@
+"""
+LLM routing tests against a local fake provider
+Covers timeouts, retries, circuit breaking and model fallback without network access
+"""
+
+import asyncio
+
+import pytest
+
+import server
+
+
+class FakeProvider:
+    """Stands in for LlmChat; behaviour is configured per "provider:model" key"""
+    def __init__(self, behaviours):
+        self.behaviours = behaviours
+        self.calls = []
+
+    def create_chat(self, provider, model, session_id, system_message):
+        return FakeChat(self, f"{provider}:{model}")
+
+
+class FakeChat:
+    def __init__(self, fake_provider, key):
+        self.fake_provider = fake_provider
+        self.key = key
+
+    async def send_message(self, user_message):
+        self.fake_provider.calls.append(self.key)
+        behaviour = self.fake_provider.behaviours[self.key]
+        if behaviour == "hang":
+            await asyncio.sleep(60)
+        if behaviour in ("slow", "slow_error"):
+            await asyncio.sleep(0.02 if behaviour == "slow_error" else 0.03)
+        if behaviour in ("error", "slow_error"):
+            raise RuntimeError("provider error")
+        return f"{self.key} reply"
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    fake = FakeProvider({})
+    monkeypatch.setattr(server, "create_llm_chat", fake.create_chat)
+    monkeypatch.setattr(server, "circuit_breakers", {})
+    monkeypatch.setattr(server, "LLM_BACKOFF_SECONDS", 0)
+    monkeypatch.setitem(server.LLM_ROUTES, "test", {
+        "timeout": 0.05,
+        "budget": 5,
+        "models": [("primary", "model-a"), ("fallback", "model-b")]
+    })
+    return fake
+
+
+def call(message="hello"):
+    return asyncio.run(server.call_llm("test", "session", "system", server.UserMessage(text=message)))
+
+
+def test_primary_model_answers(fake_provider):
+    fake_provider.behaviours.update({"primary:model-a": "ok", "fallback:model-b": "ok"})
+    assert call() == "primary:model-a reply"
+    assert fake_provider.calls == ["primary:model-a"]
+
+
+def test_timeout_falls_back_without_retrying(fake_provider):
+    fake_provider.behaviours.update({"primary:model-a": "hang", "fallback:model-b": "ok"})
+    assert call() == "fallback:model-b reply"
+    assert fake_provider.calls == ["primary:model-a", "fallback:model-b"]
+
+
+def test_fast_errors_retry_before_falling_back(fake_provider):
+    fake_provider.behaviours.update({"primary:model-a": "error", "fallback:model-b": "ok"})
+    assert call() == "fallback:model-b reply"
+    assert fake_provider.calls == ["primary:model-a"] * server.LLM_MAX_ATTEMPTS + ["fallback:model-b"]
+
+
+def test_hanging_primary_leaves_budget_for_slow_fallback(fake_provider, monkeypatch):
+    monkeypatch.setitem(server.LLM_ROUTES["test"], "budget", 0.12)
+    fake_provider.behaviours.update({"primary:model-a": "hang", "fallback:model-b": "slow"})
+    for _ in range(3):
+        assert call() == "fallback:model-b reply"
+    assert server.get_circuit_breaker("fallback", "model-b").failures == 0
+
+
+def test_budget_clipped_timeout_does_not_count_against_model(fake_provider, monkeypatch):
+    monkeypatch.setitem(server.LLM_ROUTES["test"], "budget", 0.07)
+    fake_provider.behaviours.update({"primary:model-a": "hang", "fallback:model-b": "hang"})
+    with pytest.raises(server.LlmUnavailableError):
+        call()
+    assert server.get_circuit_breaker("primary", "model-a").failures == 1
+    assert server.get_circuit_breaker("fallback", "model-b").failures == 0
+
+
+def test_translation_outage_returns_503_without_internals(fake_provider, monkeypatch):
+    monkeypatch.setitem(server.LLM_ROUTES, "translation", server.LLM_ROUTES["test"])
+    fake_provider.behaviours.update({"primary:model-a": "error", "fallback:model-b": "error"})
+    request = server.TranslationRequest(text="hello", source_language="english", target_language="malayalam")
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(server.translate_text_endpoint(request))
+    assert error.value.status_code == 503
+    assert "model" not in error.value.detail and "provider" not in error.value.detail
+
+
+def test_circuit_opens_after_sustained_errors(fake_provider, monkeypatch):
+    monkeypatch.setattr(server, "CIRCUIT_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(server, "LLM_MAX_ATTEMPTS", 1)
+    fake_provider.behaviours.update({"primary:model-a": "error", "fallback:model-b": "ok"})
+    for _ in range(3):
+        assert call() == "fallback:model-b reply"
+    # The third call skips the tripped primary entirely
+    assert fake_provider.calls.count("primary:model-a") == 2
+
+
+def test_all_models_failing_raises(fake_provider):
+    fake_provider.behaviours.update({"primary:model-a": "error", "fallback:model-b": "hang"})
+    with pytest.raises(server.LlmUnavailableError):
+        call()
+
+
+def test_budget_bounds_total_latency(fake_provider, monkeypatch):
+    monkeypatch.setitem(server.LLM_ROUTES["test"], "budget", 0.12)
+    fake_provider.behaviours.update({"primary:model-a": "hang", "fallback:model-b": "hang"})
+    with pytest.raises(server.LlmUnavailableError):
+        call()
+    assert len(fake_provider.calls) < 2 * server.LLM_MAX_ATTEMPTS
+
+
+def test_circuit_breaker_half_opens_after_cool_down(monkeypatch):
+    breaker = server.CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] += 31
+    assert breaker.allow()
+    # Only one probe while it is in flight
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.failures == 0 and breaker.opened_at is None
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_circuit(monkeypatch):
+    breaker = server.CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    breaker.record_failure()
+    now[0] += 31
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] += 31
+    assert breaker.allow()
+
+
+def test_half_open_circuit_admits_one_concurrent_probe(fake_provider, monkeypatch):
+    monkeypatch.setattr(server, "LLM_MAX_ATTEMPTS", 1)
+    monkeypatch.setitem(server.LLM_ROUTES["test"], "models", [("primary", "model-a")])
+    fake_provider.behaviours.update({"primary:model-a": "slow_error"})
+    breaker = server.get_circuit_breaker("primary", "model-a")
+    for _ in range(server.CIRCUIT_FAILURE_THRESHOLD):
+        breaker.record_failure()
+    # Cool-down has passed while the provider is still down
+    breaker.opened_at -= breaker.reset_seconds
+
+    async def burst():
+        return await asyncio.gather(
+            *[server.call_llm("test", "session", "system", server.UserMessage(text="hi")) for _ in range(50)],
+            return_exceptions=True
+        )
+
+    results = asyncio.run(burst())
+    assert all(isinstance(result, server.LlmUnavailableError) for result in results)
+    assert fake_provider.calls == ["primary:model-a"]
+    assert not breaker.allow()